@@ -1,17 +1,93 @@
 from ailib import Payload
 from preferences import Preferences
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from pathlib import Path
 import requests
 import json
 import os
 import re
+import string
 import logging
 import sys
+import time
+import threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger("hagpt")
+
+# Seconds a rendered HA entity list is reused before HA is asked again
+ENTITY_CACHE_TTL = 5.0
+# Maximum number of cleaned AI replies kept in memory
+CLEAN_CACHE_SIZE = 64
+# Maximum number of HA service calls from one AI reply sent in parallel
+HA_CALL_WORKERS = 8
+
+# Virtual entities backed by the preferences file, handled locally and never sent to HA
+_VIRTUAL_FILE_ENTITIES = frozenset({"switch.debug", "input_select.preferences"})
+
+# Result for virtual entities handled locally, same shape as a real HA call result. Read-only, callers get a copy
+_VIRTUAL_OK = MappingProxyType({"status": 200, "ok": True, "body": ""})
+# HA input_select.intelligence_level state -> OpenAI model, anything else uses DEFAULT_INTEL_MODEL
+INTEL_LEVEL_MODELS = {"High": "gpt-5-mini", "Medium": "gpt-5-nano"}
+DEFAULT_INTEL_MODEL = "gpt-4o-mini"
+# Supported OpenAI model -> (model, verbosity), anything else uses DEFAULT_INTEL_MODEL with medium verbosity
+_MODEL_TABLE = {
+    "gpt-5-mini": ("gpt-5-mini", "low"),
+    "gpt-5-nano": ("gpt-5-nano", "low"),
+}
+
+_WS_RE = re.compile(r"\s+")
+
+# Directory of this script, relative files (entities etc) are resolved against it
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _json_dumps(obj) -> bytes:
+    """Encode to JSON bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode("utf-8")
+
+
+def _json_loads(data):
+    """Decode JSON str/bytes, with orjson when it is installed. Raises json.JSONDecodeError either way."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 
 # -- GPT Home Assistant wrapper over Payload, ChatHistoryManager, PromptBuilder, ModelConnection, Preferences --
 class HAGPT:
     """
     Uses the Home Assistant services API and performs appropriate smart home operations, or just replies if request identified as a chat.
+    Version 0.9.4
+        - Unsupported services on virtual entities (eg switch.toggle on switch.debug, select_next on input_select.preferences,
+          media_player.base_speaker without volume_level) are rejected locally with "Request error: Unsupported_Virtual_Service"
+    Version 0.9.3
+        - HA/Max Base calls return a structured {"status", "ok", "body"} result instead of a "status: text" string
+    Version 0.9.2
+        - AI replies may carry several HA calls ("calls" list or a list of services), sent in parallel
+    Version 0.9.1
+        - Raw AI reply cache added and then removed, a one-shot CLI with date/time and chat history in every request can't reuse replies safely
+    Version 0.9.0
+        - Entity info now comes from a single /api/states fetch formatted locally instead of a Jinja /api/template render
+    Version 0.8.8
+        - JSON encode/decode for HA, Max Base and AI replies uses orjson when installed, stdlib json otherwise
+    Version 0.8.7
+        - Rendered HA entity info is cached for a few seconds and identical AI replies are only cleaned/parsed once
+    Version 0.8.6
+        - HA entity fetch now runs in the background while prompts, history and preferences are loaded
+    Version 0.8.5
+        - HA and Max Base calls now share one pooled keep-alive requests.Session instead of a new connection per call
     Version 0.8.4
         - Initial log message position changed to send before program failure, added error handling for .env variables (keys/tokens)
     Version 0.8.3
@@ -28,7 +104,7 @@ class HAGPT:
         - Fixed preference issue with Chat History using raw responses
     """
 
-    version = "0.8.4"
+    version = "0.9.4"
     ha_url = ""
     ha_entity_file = ""
     log_file = ""
@@ -38,50 +114,90 @@ class HAGPT:
         #Instantiate Settings/Prefs
         self.preferences = Preferences(preference_file)
 
-        #Load up settings/preferences and then instantiate Payload with preferred config
-        self.ha_url = self.preferences.get_setting_val("HA URL")
-        self.base_url = self.preferences.get_setting_val("Base URL")
-        self.ha_entity_file = self.preferences.get_setting_val("Entities File")
-        prompts_file = self.preferences.get_setting_val("Prompts File")
-        chat_hist_file = self.preferences.get_setting_val("Chat History File")
-        self.log_file = self.preferences.get_setting_val("Log File")
-        reasoning_eff = self.preferences.get_setting_val("Reasoning Effort") # Currently Not Implemented
-        ai_intel_level = self.preferences.get_setting_val("AI Intel Level") # Currrently Not Implemented
-        log_mode = self.preferences.get_setting_val("Log Mode")
-        def_pref = self.preferences.get_setting_val("Default Preference")
+        #Load up settings/preferences in one pass and then instantiate Payload with preferred config
+        settings = self.preferences.get_all_settings()
+        self.ha_url = settings.get("HA URL", "")
+        self.base_url = settings.get("Base URL", "")
+        self.ha_entity_file = settings.get("Entities File", "")
+        self._entity_path = os.path.join(_SCRIPT_DIR, self.ha_entity_file)
+        prompts_file = settings.get("Prompts File", "")
+        chat_hist_file = settings.get("Chat History File", "")
+        self.log_file = settings.get("Log File", "")
+        reasoning_eff = settings.get("Reasoning Effort", "") # Currently Not Implemented
+        ai_intel_level = settings.get("AI Intel Level", "") # Currrently Not Implemented
+        log_mode = settings.get("Log Mode", "")
+        def_pref = settings.get("Default Preference", "")
 
         #Setup Log file and current mode (Debug or Info) and create first entry
         self._configure_logging(log_mode)
-        logging.info("💡")
+        logger.info("💡")
+
+        #Load Open AI Key and HA Token from environment variables
+        api_key, self.ha_token = self._load_env_secrets()
 
-        #Load Open AI Key and HA Token from environment variable
-        api_key = self._load_openai_key()
-        self.ha_token = self._load_ha_token()
+        #HA auth header built once and reused by every HA call. It only goes to HA, never to the Max Base
+        self._ha_auth = MappingProxyType({"Authorization": f"Bearer {self.ha_token}"})
 
         #Instantiate Payload with settings values retrieved
         self.payload = Payload(prompts_file, chat_hist_file, api_key)
 
-    def _load_openai_key(self):
+        #In-process caches: rendered entity info (short TTL), entity list (until file changes) and cleaned AI replies
+        self._entity_cache = {"key": None, "text": None, "intelligence_level": None, "ts": 0.0}
+        self._entity_list_cache = {"key": None, "entities": [], "entity_set": frozenset()}
+        self._clean_cache = {}
+        self._pref_names_cache = None
 
-        api_key = os.getenv("OPENAI_API_KEY")
+        #Virtual file entities save the preferences file, serialize them when HA calls run in parallel
+        self._prefs_lock = threading.Lock()
 
-        if api_key is None:
-            logging.error("OPENAI_API_KEY environment variable not found. An OpenAI API Key is required to run this application.")            
-            print("OPENAI_API_KEY environment variable not found. An OpenAI API Key is required to run this application. Exiting.")
-            exit(1)
-        else:
-            return api_key
-        
-    def _load_ha_token(self):
+        #One pooled HTTP session for HA and Max Base so keep-alive reuses sockets between calls
+        self._http = self._create_http_session()
+
+    def _create_http_session(self):
+        """Shared requests.Session with connection pooling and light retry for HA and Max Base calls"""
+
+        session = requests.Session()
+        # Every HA and Max Base call sends JSON, so Content-Type is a session default
+        session.headers.update({"Content-Type": "application/json"})
+
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=Retry(total=2, backoff_factor=0.1))
+        for url in (self.ha_url, self.base_url):
+            scheme = urlsplit(url).scheme
+            if scheme:
+                session.mount(f"{scheme}://", adapter)
 
-        ha_token = os.getenv("HA_TOKEN")
+        return session
 
+    def close(self):
+        """Close the pooled HTTP session"""
+        self._http.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _load_env_secrets(self):
+        """Read OPENAI_API_KEY and HA_TOKEN once, report every missing one and exit if any are missing"""
+
+        env = os.environ
+        api_key = env.get("OPENAI_API_KEY")
+        ha_token = env.get("HA_TOKEN")
+
+        missing = []
+        if api_key is None:
+            missing.append("OPENAI_API_KEY environment variable not found. An OpenAI API Key is required to run this application.")
         if ha_token is None:
-            logging.error("HA_TOKEN environment variable not found. A Home Assistant Token is required to run this application.")            
-            print("HA_TOKEN environment variable not found. A Home Assistant Token is required to run this application. Exiting.")
+            missing.append("HA_TOKEN environment variable not found. A Home Assistant Token is required to run this application.")
+
+        if missing:
+            for msg in missing:
+                logger.error(msg)
+                print(f"{msg} Exiting.")
             exit(1)
-        else:
-            return ha_token
+
+        return api_key, ha_token
 
     def _configure_logging(self, log_mode: str):
         """Debug for DEBUG mode, Anything else for INFO"""
@@ -103,32 +219,54 @@ class HAGPT:
         Clean AI response and parse JSON for service, target, variables, and response_text.
         Assumes AI input is correct and formatted properly.
         """
-        import json, re
-        cleaned = re.sub(r'^```[a-zA-Z]*\n?', '', ai_response.strip())
-        cleaned = re.sub(r'\n?```$', '', cleaned.strip())
+        cached = self._clean_cache.get(ai_response)
+        if cached is not None:
+            return dict(cached)
+
+        # Peel off ```json ... ``` code fences if the AI added them
+        cleaned = ai_response.strip()
+        if cleaned.startswith("```"):
+            # Drop the fence, its language tag and one newline, same as the old ^```[a-zA-Z]*\n? pattern
+            cleaned = cleaned[3:].lstrip(string.ascii_letters)
+            if cleaned.startswith("\n"):
+                cleaned = cleaned[1:]
+        cleaned = cleaned.strip()
+        if cleaned.endswith("```"):
+            # Closing fence plus one newline before it, like \n?```$ did
+            cleaned = cleaned[:-3]
+            if cleaned.endswith("\n"):
+                cleaned = cleaned[:-1]
 
         try:
-            data = json.loads(cleaned)
+            data = _json_loads(cleaned)
             service = data.get("service")
             target = data.get("target", {})
             variables = data.get("variables", {})
             response_text = data.get("response_text", "")
             dataopt = data.get("data",{})
+            calls = data.get("calls", [])
         except json.JSONDecodeError:
             # Fallback: treat entire cleaned string as response_text
             service = None
             target = {}
             variables = {}
             dataopt = {}
+            calls = []
             response_text = cleaned
 
-        return {
+        clean_response = {
             "service": service,
             "target": target,
             "variables": variables,
             "response_text": response_text,
-            "data": dataopt 
+            "data": dataopt,
+            "calls": calls
         }
+        if len(self._clean_cache) >= CLEAN_CACHE_SIZE:
+            self._clean_cache.pop(next(iter(self._clean_cache)))
+        self._clean_cache[ai_response] = clean_response
+
+        return dict(clean_response)
 
     def _call_ha_service(self, service, target=None, data=None, dataopt=None, variables=None):
         
@@ -137,9 +275,34 @@ class HAGPT:
         if dataopt is None: dataopt = {}
         if variables is None: variables = {}
 
+        entity_id = target.get("entity_id")
+
+        #Process virtual devices first and skip the HA update since they don't really exist
+        if isinstance(entity_id, str):
+            if entity_id in _VIRTUAL_FILE_ENTITIES:
+                #switch.debug is set by the service (turn_on/turn_off), input_select.preferences by the selected option
+                if entity_id == "input_select.preferences":
+                    virt_setting = data.get("option") if service == "input_select.select_option" else None
+                else:
+                    virt_setting = service.partition(".")[2]
+                    if virt_setting not in ("turn_on", "turn_off"):
+                        virt_setting = None
+                if not virt_setting:
+                    logger.warning("Virtual Entity: %s does not support service '%s' with data %s", entity_id, service, data)
+                    return {"status": 0, "ok": False, "body": f"Request error: Unsupported_Virtual_Service {service}"}
+                self._set_virtual_file_entity(entity_id, virt_setting)
+                return dict(_VIRTUAL_OK)
+            if entity_id == "media_player.base_speaker":
+                #Set Volume Level value via Max Base Station API Call -> media_player.base_speaker
+                vol_level_val = data.get("volume_level")
+                if vol_level_val is None:
+                    logger.warning("Virtual Entity: %s needs a volume_level, got service '%s' with data %s", entity_id, service, data)
+                    return {"status": 0, "ok": False, "body": f"Request error: Unsupported_Virtual_Service {service}"}
+                logger.debug("AI Volume Level: %s", vol_level_val)     
+                return self._set_virtual_entity_base(entity_id, vol_level_val)
+
         domain, service_name = service.split(".", 1)
         url = f"{self.ha_url}/api/services/{domain}/{service_name}"
-        entity_id = target.get("entity_id")
         payload = {}
 
         #Setup payload depending on the HA Entity Type
@@ -147,12 +310,7 @@ class HAGPT:
             #Scripts
             payload = {"entity_id": entity_id, "variables": variables}
         elif service == "input_select.select_option" and data:
-            #Process virtual devices and skip the HA update since they don't really exist
-            if entity_id == "input_select.preferences":
-                pref_sel = data.get("option")      
-                self._set_virtual_file_entity(entity_id, pref_sel)
-                return {"ha_result": "200: OK"}
-            #All other real HA Input Select Entities (Intelligence Level)
+            #Real HA Input Select Entities (Intelligence Level)
             payload = {"entity_id": entity_id}
             payload.update(data)  
         elif service.startswith("notify.") and data:
@@ -164,40 +322,25 @@ class HAGPT:
                 payload = {} # No entity for other notify services {"entity_id": entity_id}
             payload.update(data)  
         else:
-            #Process virtual devices and skip the HA update since they don't really exist
-            if entity_id == "switch.debug":
-                self._set_virtual_file_entity(entity_id, service_name)
-                return {"ha_result": "200: OK"}
-            elif entity_id == "media_player.base_speaker" and data:
-                #Set Volume Level value via Max Base Station API Call -> media_player.base_speaker
-                vol_level_val = data.get("volume_level")
-                logging.debug(f"AI Volume Level: {vol_level_val}")     
-                ret_val = self._set_virtual_entity_base(entity_id, vol_level_val)
-                return ret_val
-        
             # All other real HA services (light.turn_on, switch.toggle, etc.)
             payload = {"entity_id": entity_id}
             payload.update(data)
 
-        logging.debug(f"Final HA payload to send: {payload}")
-        headers = {
-            "Authorization": f"Bearer {self.ha_token}",
-            "Content-Type": "application/json"
-        }
+        logger.debug("Final HA payload to send: %s", payload)
 
-        logging.info(f"HA API sending as: {url}")
-        logging.info(f"HA API sending with: {payload}")
+        logger.info("HA API sending as: %s", url)
+        logger.info("HA API sending with: %s", payload)
         
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=10)
+            response = self._http.post(url, headers=self._ha_auth, data=_json_dumps(payload), timeout=10)
             if not response.ok:
-                logging.error(f"HA ERROR {response.status_code}: {response.text}")
+                logger.error("HA ERROR %s: %s", response.status_code, response.text)
             else:
-                logging.debug(f"HA HTTP response status: {response.status_code}, content: {response.text}")
-            return {"ha_result": f"{response.status_code}: OK" if response.ok else f"{response.status_code}: {response.text}"}
+                logger.debug("HA HTTP response status: %s, content: %s", response.status_code, response.text)
+            return {"status": response.status_code, "ok": response.ok, "body": response.text}
         except requests.exceptions.RequestException as e:
-            logging.error(f"HA service call failed: {e}")
-            return {"ha_result": f"Request error: {str(e)}"}
+            logger.error("HA service call failed: %s", e)
+            return {"status": 0, "ok": False, "body": f"Request error: {str(e)}"}
     
     def _set_virtual_file_entity(self, virt_entity: str, virt_setting: str):
         
@@ -216,12 +359,14 @@ class HAGPT:
             setting_name = "Default Preference"
             setting_value = virt_setting
         else:
-            logging.warning(f"Virtual Entity: {virt_entity} could not be set to '{virt_setting}', as it is not supported")
+            logger.warning("Virtual Entity: %s could not be set to '%s', as it is not supported", virt_entity, virt_setting)
             return
         
-        self.preferences.change_setting_val(setting_name,setting_value)
-        set_val = self.preferences.get_setting_val(setting_name)
-        logging.info(f"{setting_name} current setting value: {set_val}")        
+        with self._prefs_lock:
+            self.preferences.change_setting_val(setting_name,setting_value)
+            self._pref_names_cache = None
+            set_val = self.preferences.get_setting_val(setting_name)
+        logger.info("%s current setting value: %s", setting_name, set_val)        
 
     def _set_virtual_entity_base(self, virt_entity: str, virt_setting: str):
         """ For virt_entity, virt_setting example values: volume_level, 50"""
@@ -237,44 +382,42 @@ class HAGPT:
             vol_setting = "level"
             try:
                 vol_level = float(virt_setting) 
-            except ValueError:
-                logging.error(f"Could not convert vol_level: '{virt_setting}' to float")
-                return {"ha_result": f"Request error: Volume_Float_Conversion"}
+            except (TypeError, ValueError):
+                logger.error("Could not convert vol_level: '%s' to float", virt_setting)
+                return {"status": 0, "ok": False, "body": "Request error: Volume_Float_Conversion"}
            
             payload = {"volume":{vol_setting: vol_level}}
-            logging.debug(f"Max Virt Entity Payload: {payload}")
+            logger.debug("Max Virt Entity Payload: %s", payload)
 
         max_url = f"{self.base_url}/control"
-        headers = {"Content-Type": "application/json"}
 
-        logging.info(f"Max API sending as: {max_url}")
-        logging.info(f"Max API sending with: {payload}")
+        logger.info("Max API sending as: %s", max_url)
+        logger.info("Max API sending with: %s", payload)
 
         try:
-            response = requests.post(max_url, headers=headers, json=payload, timeout=10)
+            response = self._http.post(max_url, data=_json_dumps(payload), timeout=10)
             if not response.ok:
-                logging.error(f"Max Base ERROR {response.status_code}: {response.text}")
+                logger.error("Max Base ERROR %s: %s", response.status_code, response.text)
             else:
-                logging.debug(f"Max Base HTTP response status: {response.status_code}, content: {response.text}")
-            return {"ha_result": f"{response.status_code}: OK" if response.ok else f"{response.status_code}: {response.text}"}
+                logger.debug("Max Base HTTP response status: %s, content: %s", response.status_code, response.text)
+            return {"status": response.status_code, "ok": response.ok, "body": response.text}
         except requests.exceptions.RequestException as e:
-            logging.error(f"Max Base service call failed: {e}")
-            return {"ha_result": f"Request error: {str(e)}"}
+            logger.error("Max Base service call failed: %s", e)
+            return {"status": 0, "ok": False, "body": f"Request error: {str(e)}"}
 
     def set_openAI_model(self, model: str):
         """One of 'gpt-5-mini', 'gpt-5-nano', 'gpt-4o-mini'"""
 
-        #gpt-5* have low as valid value, gpt-4o-mini does not so set here and have else change to valid for 4
+        #gpt-5* have low as valid verbosity, gpt-4o-mini does not so it gets medium (the table default)
         #ModelConnection currently sets this as medium because of 4o issue.  Needs to be fixed so we can accept default here
-        self.payload.connection.set_verbosity("low")
+        name, verbosity = _MODEL_TABLE.get(model, (DEFAULT_INTEL_MODEL, "medium"))
 
-        if model == "gpt-5-mini":
-            self.payload.connection.set_model("gpt-5-mini")
-        elif model == "gpt-5-nano":
-            self.payload.connection.set_model("gpt-5-nano")
-        else:
-            self.payload.connection.set_model("gpt-4o-mini")
-            self.payload.connection.set_verbosity("medium")
+        #Only call the setters on an actual change
+        conn = self.payload.connection
+        if conn.model != name:
+            conn.set_model(name)
+        if conn.verbosity != verbosity:
+            conn.set_verbosity(verbosity)
 
     def get_ha_entity_info(self, input_file):
         """Retrieve current entity and state info from HA but only 
@@ -283,78 +426,127 @@ class HAGPT:
         if not input_file:
             raise ValueError("Usage: get_ha_entity_info(<entity_list_file>)")
 
-        # Resolve file path relative to the script directory
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        input_path = os.path.join(script_dir, input_file)
+        # Resolve file path relative to the script directory (precomputed for the configured entities file)
+        if input_file == self.ha_entity_file:
+            input_path = self._entity_path
+        else:
+            input_path = os.path.join(_SCRIPT_DIR, input_file)
 
         try:
-            with open(input_path, "r", encoding="utf-8") as f:
-                entities = [line.strip() for line in f if line.strip()]
+            stat = os.stat(input_path)
         except FileNotFoundError:
             raise FileNotFoundError(f"Entity list file not found: {input_path}")
 
-        # Build entity list: "switch.fan","switch.kettle",...
-        entity_list = ",".join(f"\"{e}\"" for e in entities)
+        # Reuse the last rendered entity info if the entity file is unchanged and it is still fresh
+        cache_key = (input_path, stat.st_mtime_ns, stat.st_size)
+        cache = self._entity_cache
+        if cache["key"] == cache_key and time.monotonic() - cache["ts"] < ENTITY_CACHE_TTL:
+            logger.debug("Using cached HA entity info")
+            self._apply_intelligence_level(cache["intelligence_level"])
+            return cache["text"]
+
+        # The entity list itself is only re-read from disk when the file changes
+        if self._entity_list_cache["key"] == cache_key:
+            entities = self._entity_list_cache["entities"]
+            entity_set = self._entity_list_cache["entity_set"]
+        else:
+            try:
+                # One entity per line, optionally annotated for the AI: "notify.mobile_app_x (Darin)"
+                raw = Path(input_path).read_text(encoding="utf-8")
+            except FileNotFoundError:
+                raise FileNotFoundError(f"Entity list file not found: {input_path}")
+            entities = [ln.strip() for ln in raw.splitlines() if ln.strip()]
+            # Bare entity ids (annotation dropped) for matching against /api/states
+            entity_set = frozenset(ln.split(" ", 1)[0] for ln in entities)
+            self._entity_list_cache = {"key": cache_key, "entities": entities, "entity_set": entity_set}
+
+        # Fetch all states once as JSON and format the listed entities locally, no server side Jinja rendering
+        response = self._http.get(f"{self.ha_url}/api/states", headers=self._ha_auth, timeout=10)
 
-        # Build Jinja2 template same as Bash version
-        template = (
-            "{% for e in ["
-            f"{entity_list}"
-            "] %}{{ e }} ({{ state_attr(e, \"friendly_name\") or "
-            "e.split('.')[1]|replace('_',' ')|title }}) state:{{ states(e) }}\\n{% endfor %}"
-        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Error {response.status_code}: {response.text}")
 
-        json_payload = json.dumps({"template": template})
+        # Decode the raw bytes once with the C decoder (orjson) instead of response.json()'s charset sniff + str copy
+        ha_states = {s["entity_id"]: s for s in _json_loads(response.content) if s.get("entity_id") in entity_set}
 
-        headers = {
-            "Authorization": f"Bearer {self.ha_token}",
-            "Content-Type": "application/json",
-        }
+        # Same format the HA template used to render: "<entity_id> (<friendly name>) state:<state>", in file order.
+        # Annotated lines keep their annotation in the label, the bare id is used for the state lookup
+        lines = []
+        for line in entities:
+            eid = line.split(" ", 1)[0]
+            ha_state = ha_states.get(eid, {})
+            attrs = ha_state.get("attributes") or {}
+            name = attrs.get("friendly_name") or eid.split(".", 1)[-1].replace("_", " ").title()
+            lines.append(f"{line} ({name}) state:{ha_state.get('state', 'unknown')}")
 
-        response = requests.post(f"{self.ha_url}/api/template", headers=headers, data=json_payload)
+        # Collapse any stray whitespace/newlines so the entity info stays on a single line
+        text = _WS_RE.sub(" ", " ".join(lines)).strip()
 
-        if response.status_code != 200:
-            raise RuntimeError(f"Error {response.status_code}: {response.text}")
+        intelligence_level = ha_states.get("input_select.intelligence_level", {}).get("state")
+        if intelligence_level is not None:
+            logger.debug("Intelligence level is set to HA Level: %s", intelligence_level)  
 
-        # Clean response text similar to sed: replace escaped newlines and extra spaces
-        text = response.text.replace("\\n", "\n")
-        text = " ".join(text.split())
-
-        match = re.search(r'input_select\.intelligence_level.*?state:(\w+)', text)
-        if match:
-            intelligence_level = match.group(1)
-            logging.debug(f"Intelligence level is set to HA Level: {intelligence_level}")  
-            if intelligence_level == "High":
-                self.set_openAI_model("gpt-5-mini")
-            elif intelligence_level == "Medium":
-                self.set_openAI_model("gpt-5-nano")
-            else:
-                self.set_openAI_model("gpt-4o-mini")
-
-        else:
-            intelligence_level = None
+        self._apply_intelligence_level(intelligence_level)
 
+        self._entity_cache = {"key": cache_key, "text": text, "intelligence_level": intelligence_level, "ts": time.monotonic()}
 
         return text
 
+    def _apply_intelligence_level(self, intelligence_level):
+        """Set the OpenAI model from the HA intelligence level. None leaves the current model alone."""
+
+        if intelligence_level is None:
+            return
+
+        self.set_openAI_model(INTEL_LEVEL_MODELS.get(intelligence_level, DEFAULT_INTEL_MODEL))
+
     def get_valid_preference_names(self):
         
-        #Get valid user preference names.
-        all_preferences = self.preferences.get_key_val(["User Prefs"])
-        first_loop = True
-        for preference_name in all_preferences:
-            if not first_loop:
-                pref_names = pref_names + ", " + preference_name
-            else:
-                pref_names = "Valid Preference Names (" + preference_name
-                first_loop = False
-        pref_names = pref_names + ")"
+        #Get valid user preference names. Cached until a setting is changed via a virtual entity
+        if self._pref_names_cache is None:
+            all_preferences = self.preferences.get_key_val(["User Prefs"])
+            self._pref_names_cache = f"Valid Preference Names ({', '.join(all_preferences)})"
+
+        return self._pref_names_cache
+
+    @staticmethod
+    def _format_ha_result(ha_ret):
+        """Legacy "<status>: OK" / "<status>: <body>" / "Request error: ..." string of an HA call result, for logs and ha_result"""
+
+        if ha_ret["ok"]:
+            return f"{ha_ret['status']}: OK"
+        if ha_ret["status"]:
+            return f"{ha_ret['status']}: {ha_ret['body']}"
+        return ha_ret["body"]
+
+    def _build_ha_calls(self, clean_response):
+        """
+        Collect (service, target, data, dataopt, variables) tuples for every HA call in the cleaned AI response.
+        Supports a single "service", a list of services sharing target/data, and a "calls" list of service objects.
+        """
+        service = clean_response.get("service")
+        # The AI sometimes sends null for these, normalize to empty dicts
+        target = clean_response.get("target") or {}
+        data = clean_response.get("data") or {}
+        dataopt = clean_response.get("dataopt") or {}
+        variables = clean_response.get("variables") or {}
+
+        calls = []
+        if isinstance(service, list):
+            calls.extend((svc, target, data, dataopt, variables) for svc in service if svc)
+        elif service:
+            calls.append((service, target, data, dataopt, variables))
+
+        for call in clean_response.get("calls") or []:
+            if isinstance(call, dict) and call.get("service"):
+                calls.append((call["service"], call.get("target") or {}, call.get("data") or {}, call.get("dataopt") or {}, call.get("variables") or {}))
 
-        return pref_names
+        return calls
 
     def process_ai_response(self, ai_response):
         """
-        Process AI response and call Home Assistant service.
+        Process AI response and call Home Assistant service(s).
+        Multiple calls (notify fan-out, several entities) are sent in parallel over the pooled session.
         Assumes AI input is correct and well-formed.
         """
         ha_result = None
@@ -367,21 +559,27 @@ class HAGPT:
         variables = clean_response.get("variables", {})
         response_text = clean_response.get("response_text", "")
 
-        if service:
-            ha_ret = self._call_ha_service(service, target, data, dataopt, variables)
-            ha_result = ha_ret.get("ha_result")
+        calls = self._build_ha_calls(clean_response)
 
-            # Only process special entities if HA succeeded
-            try:
-                status_code = int(ha_result.split(":")[0])
-            except (ValueError, IndexError):
-                status_code = 0
+        if len(calls) == 1:
+            ha_rets = [self._call_ha_service(*calls[0])]
+        elif calls:
+            with ThreadPoolExecutor(max_workers=min(len(calls), HA_CALL_WORKERS)) as executor:
+                ha_rets = list(executor.map(lambda call: self._call_ha_service(*call), calls))
+        else:
+            ha_rets = []
 
-            if 200 <= status_code < 300:
-                entity_id = target.get("entity_id")
+        ha_results = [self._format_ha_result(ha_ret) for ha_ret in ha_rets]
 
-            else:
-                logging.info(f"AI update failed: {ha_result}")
+        for ha_ret, call_result in zip(ha_rets, ha_results):
+            if not 200 <= ha_ret["status"] < 300:
+                logger.info("AI update failed: %s", call_result)
+
+        # Keep a plain result for the usual single call, a list when several calls were made
+        if len(ha_results) == 1:
+            ha_result = ha_results[0]
+        elif ha_results:
+            ha_result = ha_results
 
         return {
             "service": service,
@@ -389,6 +587,7 @@ class HAGPT:
             "data": data,
             "dataopt": dataopt,
             "variables": variables,
+            "calls": clean_response.get("calls") or [],
             "response_text": response_text,
             "ha_result": ha_result
         }
@@ -398,40 +597,47 @@ class HAGPT:
 
     def main(self):
 
+        # The command line is validated before HAGPT is built, this only guards callers importing the class
         if len(sys.argv) < 2:
-            print("Usage: python hagpt.py <MESSAGE_TO_AI>")
             return("<MESSAGE_TO_AI> parameter is required, HAGPT exiting")
-            sys.exit(1)
 
         script = sys.argv[0]
         user_msg = sys.argv[1]
         
-        logging.info(f"HAGPT v{self.version} class currently using ModelConnection v{self.payload.connection.version}, PromptBuilder v{self.payload.prompts.version}, ChatHistoryManager v{self.payload.history.version}, Preferences v{self.preferences.version}, Payload v{self.payload.version}")
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("HAGPT v%s class currently using ModelConnection v%s, PromptBuilder v%s, ChatHistoryManager v%s, Preferences v%s, Payload v%s", self.version, self.payload.connection.version, self.payload.prompts.version, self.payload.history.version, self.preferences.version, self.payload.version)
 
         # This setting will be overriden when get_ha_entity_info retrieves HA's stored value 
         # but default here in case it is not successfully retrieved. We have this in settings now
         # but not sure if we will activate because a tool will be required for AI to change setting
         self.set_openAI_model("gpt-5-nano")
-        
-        self.payload.prompts.load_prompt("hagpt")
-        self.payload.history.load_history("hagpt")
 
-        #logging.info("!!!! History is currently being Reset for each interaction !!!!")
-        #self.payload.history.reset_history()
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            # Load allowed HA entity info and states for the AI - Set Intelligence level after load.
+            # The HA round trip runs in the background while the local prompt/history/preference work is done.
+            entity_info_future = executor.submit(self.get_ha_entity_info, self.ha_entity_file)
 
-        # Get Current Date formatted as 'Wednesday, Oct 01, 2025
-        current_date = datetime.now().strftime('%A, %b %d, %Y')
-        # Get Current Time formatted as '2:10 PM'
-        current_time = datetime.now().strftime('%-I:%M %p')
-        curr_date_time = f"Current Date: {current_date}  Current Time: {current_time} "
+            self.payload.prompts.load_prompt("hagpt")
+            self.payload.history.load_history("hagpt")
 
-        # Load allowed HA entity info and states for the AI - Set Intelligence level after load
-        entity_info = self.get_ha_entity_info(self.ha_entity_file)
+            #logging.info("!!!! History is currently being Reset for each interaction !!!!")
+            #self.payload.history.reset_history()
 
-        pref_names = self.get_valid_preference_names()
-        logging.debug(f"Valid Preference Names: {pref_names}")
+            # One clock read for the prompt date/time and the chat history stamp
+            now = datetime.now()
+            # Get Current Date formatted as 'Wednesday, Oct 01, 2025
+            current_date = now.strftime('%A, %b %d, %Y')
+            # Get Current Time formatted as '2:10 PM'
+            current_time = now.strftime('%-I:%M %p')
+            curr_date_time = f"Current Date: {current_date}  Current Time: {current_time} "
+            hist_date_time = now.strftime("%Y-%m-%d %H:%M:%S")
 
-        logging.info(f"Model: {self.payload.connection.model}, Verbosity: {self.payload.connection.verbosity}, Reasoning: {self.payload.connection.reasoning_effort}, Max Tokens: {self.payload.connection.maximum_tokens}")
+            pref_names = self.get_valid_preference_names()
+            logger.debug("Valid Preference Names: %s", pref_names)
+
+            entity_info = entity_info_future.result()
+
+        logger.info("Model: %s, Verbosity: %s, Reasoning: %s, Max Tokens: %s", self.payload.connection.model, self.payload.connection.verbosity, self.payload.connection.reasoning_effort, self.payload.connection.maximum_tokens)
 
         # We have data to share with the AI. The current date/time, a list of HA Entities and their states 
         # as well as the default Preference and a list of valid preferences. It is not appropriate to add this
@@ -442,17 +648,17 @@ class HAGPT:
 
         active_pref = self.preferences.get_active_preference()
         if len(active_pref) == 0:
-            logging.info(f"No Active Preference is being added to prompt. Ensure a valid default is set.")
+            logger.info("No Active Preference is being added to prompt. Ensure a valid default is set.")
         else:
             special_user_role_content += f"Active -> {active_pref} "
 
-        logging.debug(f"Special User Role Content: {special_user_role_content}")
+        logger.debug("Special User Role Content: %s", special_user_role_content)
 
         active_prompt = self.payload.prompts.get_prompt()
 
-        logging.debug(f"Prompt Loaded: [{active_prompt}]")
+        logger.debug("Prompt Loaded: [%s]", active_prompt)
 
-        logging.info(f"User Message: [{user_msg}]")
+        logger.info("User Message: [%s]", user_msg)
 
         # We don't want to automatically add the AI response to chat history since it will be full of json
         # for the entities, devices, data, variables etc.  The important thing is to keep chat context
@@ -461,20 +667,19 @@ class HAGPT:
 
         # Send the user mesage to AI and receive the response
         reply = self.payload.send_message(user_msg, None, special_user_role_content)
-        logging.info(f"Assistant Raw Reply: {reply}")
+        logger.info("Assistant Raw Reply: %s", reply)
  
         ret = self.process_ai_response(reply)
         if ret:
-            logging.debug(f"process_ai_response Full Return Value: {ret}")
+            logger.debug("process_ai_response Full Return Value: %s", ret)
             response_val = ret.get("response_text") or ""
 
         else:
             response_val = "AI response error, could not Process"
-            logging.info(f"AI response error, return is: {ret}")
+            logger.info("AI response error, return is: %s", ret)
 
         # Adding current date/time to user message and reply in the chat history. This gives the AI some context relative to time so
         # it can distinguish between a conversation that is delayed a couple of seconds ago or a couple of days. Can be same date/time though.
-        hist_date_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         user_msg_hist = f"[{hist_date_time}] {user_msg}"
         response_val_hist = f"[{hist_date_time}] {response_val}"
 
@@ -483,7 +688,7 @@ class HAGPT:
         # self.payload.add_to_chat_history(user_msg, response_val)
         self.payload.add_to_chat_history(user_msg_hist, response_val_hist)
 
-        logging.info(f"main() Returning (response_val): [{response_val}]")        
+        logger.info("main() Returning (response_val): [%s]", response_val)        
 
 
         return response_val
@@ -491,13 +696,17 @@ class HAGPT:
 
 if __name__ == "__main__":
 
-    # Change the current working directory to this script for imports and relative pathing
-    program_path = os.path.dirname(os.path.abspath(__file__))
-    os.chdir(program_path)
+    # Validate arguments before loading settings, Payload, etc.
+    if len(sys.argv) < 2:
+        print("Usage: python hagpt.py <MESSAGE_TO_AI>")
+        print("<MESSAGE_TO_AI> parameter is required, HAGPT exiting")
+        sys.exit(1)
 
-    wrapper = HAGPT("hagpt.json")
+    # Change the current working directory to this script for imports and relative pathing
+    os.chdir(_SCRIPT_DIR)
 
-    ai_response = wrapper.main()
+    with HAGPT("hagpt.json") as wrapper:
+        ai_response = wrapper.main()
   
     print(f"{ai_response}")
     
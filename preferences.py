@@ -4,7 +4,7 @@ from pathlib import Path
 
 class Preferences:
     
-    version = "0.0.1"  # Class attribute for version
+    version = "0.0.2"  # Class attribute for version
         
     def __init__(self, preferences_file: str):
         self.preferences_file = Path(preferences_file)
@@ -49,6 +49,12 @@ class Preferences:
 
         return setting_val
 
+    def get_all_settings(self) -> dict:
+        """ Get all top level JSON key settings in one pass (nested sections like User Prefs excluded).
+        Values match get_setting_val, empty values come back as "" """
+
+        return {key: (val or "") for key, val in self._preferences.items() if not isinstance(val, dict)}
+
     def get_key_val(self, keys):
         """Gets all keys under key(s) hierarchy supplied 
         eg: ["User Prefs","Default","AI Interaction Prefs"] """